@@ -23,14 +23,32 @@ HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
 }
 
-# Redis configuration
-REDIS_URL = os.getenv("UPSTASH_REDIS_REST_URL")
-REDIS_TOKEN = os.getenv("UPSTASH_REDIS_REST_TOKEN")
+# Redis configuration (a redis:// or rediss:// URL, e.g. Upstash's TCP endpoint)
+REDIS_URL = os.getenv("UPSTASH_REDIS_URL")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
 
 # Check if Redis environment variables are set
-if not REDIS_URL or not REDIS_TOKEN:
+if not REDIS_URL:
     print("⚠️ Warning: Redis configuration missing. Cache will be disabled.")
 
+# Use uvloop as the event loop when available (it is not supported on Windows)
+USE_UVLOOP = os.getenv("USE_UVLOOP", "True").lower() == "true"
+
+# Rate limiting (per client address and route)
+RATE_LIMIT = 30          # requests per window
+RATE_LIMIT_WINDOW = 60   # seconds
+
+# How long an encoded /metrics response is reused
+METRICS_CACHE_SECONDS = 1.0
+
+# Batch album lookups
+BATCH_MAX_SIZE = 20       # albums per request
+BATCH_CONCURRENCY = 5     # albums looked up at once
+
 # Playwright configuration
 PLAYWRIGHT_HEADLESS = True
 PLAYWRIGHT_TIMEOUT = 30000  # milliseconds
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "4"))  # reusable browser contexts per worker
+# Launch the browser at startup instead of on the first scrape. This imports
+# Playwright in every worker, trading startup time and memory for a faster first scrape.
+PLAYWRIGHT_WARM_START = os.getenv("PLAYWRIGHT_WARM_START", "False").lower() == "true"
@@ -1,38 +1,229 @@
-from fastapi import FastAPI, HTTPException, Request, Query, Depends
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from time import time
+import asyncio
+import hashlib
+import orjson
+import time
+from fastapi import FastAPI, HTTPException, Request, Query, Body, Depends
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import TypeAdapter
 from contextlib import asynccontextmanager
-from typing import Optional
-
-from .config import API_VERSION, API_DESCRIPTION
+from typing import Awaitable, Callable, Optional, TypeVar, Union
+
+from .config import (
+    API_VERSION,
+    API_DESCRIPTION,
+    RATE_LIMIT,
+    RATE_LIMIT_WINDOW,
+    BATCH_MAX_SIZE,
+    BATCH_CONCURRENCY,
+    USE_UVLOOP,
+    PLAYWRIGHT_WARM_START,
+    METRICS_CACHE_SECONDS,
+)
+from .middleware import (
+    MetricsMiddleware,
+    RateLimitMiddleware,
+    StaticCORSMiddleware,
+    rate_limit_key,
+)
 from .utils.metrics import metrics
 from .utils.cache import (
-    get_cache,
-    set_cache,
+    redis_client,
+    close_cache,
+    get_cache_raw,
+    set_cache_raw,
+    charge_window,
     ALBUM_TTL,
     SIMILAR_TTL,
     USER_TTL,
     SEARCH_TTL,
+    NEGATIVE_TTL,
+    NOT_FOUND_MARKER,
 )
-from .models import Album, UserProfile, SearchResult
-from .scraper.aoty_scraper import (
-    get_album_url,
-    scrape_album,
-    get_user_profile,
-    get_similar_albums,
-    search_albums,
-)
+from .models import Album, UserProfile, SearchResult, AlbumQuery, AlbumBatchError
+
+
+# Run on uvloop when it is installed; uvicorn --loop uvloop does the same for the server
+if USE_UVLOOP:
+    try:
+        import uvloop
+
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+# Serializers for responses, built once instead of per request
+_album_adapter = TypeAdapter(Album)
+_album_list_adapter = TypeAdapter(list[Album])
+_search_list_adapter = TypeAdapter(list[SearchResult])
+_user_adapter = TypeAdapter(UserProfile)
+_batch_error_adapter = TypeAdapter(AlbumBatchError)
+
+T = TypeVar("T")
+
+
+# The scraper module, once a request has needed it
+_scraper_module = None
+
+
+def _scraper():
+    """Import the scraper on first use, so Playwright only loads in workers that scrape"""
+    global _scraper_module
+    if _scraper_module is None:
+        from .scraper import aoty_scraper
+
+        _scraper_module = aoty_scraper
+    return _scraper_module
+
+
+# Encoded /metrics body, regenerated at most every METRICS_CACHE_SECONDS
+_metrics_cache = {"at": float("-inf"), "body": b""}
+
+# Scrapes currently running, keyed by cache key
+_inflight: dict[str, asyncio.Task] = {}
+
+# Cache writes still running after their response was sent
+_background_tasks: set[asyncio.Task] = set()
+
+
+def run_in_background(coro: Awaitable) -> None:
+    """Start a coroutine without awaiting it, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+
+
+def _background_task_done(task: asyncio.Task) -> None:
+    """Drop a finished background task and log its failure, if any"""
+    _background_tasks.discard(task)
+    if not task.cancelled() and (error := task.exception()):
+        print(f"Background task failed: {str(error)}")
+
+
+async def singleflight(key: str, coro_factory: Callable[[], Awaitable[T]]) -> T:
+    """Run coro_factory() once for concurrent callers with the same key and share the result"""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(coro_factory())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+
+    # Shield so one caller disconnecting doesn't cancel the scrape for the others
+    return await asyncio.shield(task)
+
+
+def _norm(text: str) -> str:
+    """Normalize user input for cache keys so equivalent lookups share an entry"""
+    return " ".join(text.lower().split())
+
+
+async def _cached_json(
+    cache_key: str, scrape: Callable[[], Awaitable[bytes]], refresh: bool = False
+) -> bytes:
+    """
+    Get encoded JSON from the cache, scraping it on a miss. When a hit is
+    expired early, it is still served while a refresh runs in the background.
+    """
+    # Check cache unless refresh is requested
+    if not refresh and (cached := await get_cache_raw(cache_key)):
+        metrics.record_request(cache_hit=True)
+        # Only album lookups are negatively cached
+        if cached.value == NOT_FOUND_MARKER:
+            raise HTTPException(status_code=404, detail="Album not found")
+        if cached.expired_early:
+            run_in_background(singleflight(cache_key, scrape))
+        return cached.value
+
+    metrics.record_request(cache_hit=False)
+    return await singleflight(cache_key, scrape)
+
+
+async def _scrape_album_json(artist: str, album: str, cache_key: str) -> bytes:
+    """Scrape an album, cache its encoded JSON and return it"""
+    start = time.perf_counter()
+    result = await _scraper().get_album_url(artist, album)
+    if not result:
+        run_in_background(set_cache_raw(cache_key, NOT_FOUND_MARKER, NEGATIVE_TTL))
+        raise HTTPException(status_code=404, detail="Album not found")
+
+    url, artist_name, title = result
+    album_data = await _scraper().scrape_album(url, artist_name, title)
+
+    raw = _album_adapter.dump_json(album_data)
+    run_in_background(
+        set_cache_raw(cache_key, raw, ALBUM_TTL, time.perf_counter() - start)
+    )
+    return raw
+
+
+async def _get_album_json(artist: str, album: str, refresh: bool = False) -> bytes:
+    """Get an album's encoded JSON from the cache, scraping it on a miss"""
+    cache_key = f"album:{_norm(artist)}:{_norm(album)}:json:v2"
+    return await _cached_json(
+        cache_key, lambda: _scrape_album_json(artist, album, cache_key), refresh
+    )
+
+
+async def _scrape_similar_json(artist: str, album: str, limit: int, cache_key: str) -> bytes:
+    """Scrape albums similar to an album, cache the encoded JSON list and return it"""
+    start = time.perf_counter()
+    result = await _scraper().get_album_url(artist, album)
+    if not result:
+        run_in_background(set_cache_raw(cache_key, NOT_FOUND_MARKER, NEGATIVE_TTL))
+        raise HTTPException(status_code=404, detail="Album not found")
+
+    url, _, _ = result
+    similar_albums = await _scraper().get_similar_albums(url, limit)
+
+    raw = _album_list_adapter.dump_json(similar_albums)
+    run_in_background(
+        set_cache_raw(cache_key, raw, SIMILAR_TTL, time.perf_counter() - start)
+    )
+    return raw
+
+
+async def _scrape_search_json(query: str, limit: int, cache_key: str) -> bytes:
+    """Run a search, cache the encoded JSON results and return them"""
+    start = time.perf_counter()
+    results = await _scraper().search_albums(query, limit)
+
+    raw = _search_list_adapter.dump_json(results)
+    run_in_background(
+        set_cache_raw(cache_key, raw, SEARCH_TTL, time.perf_counter() - start)
+    )
+    return raw
+
+
+async def _scrape_user_json(username: str, cache_key: str) -> bytes:
+    """Scrape a user profile, cache its encoded JSON and return it"""
+    start = time.perf_counter()
+    user_profile = await _scraper().get_user_profile(username)
+
+    raw = _user_adapter.dump_json(user_profile)
+    run_in_background(
+        set_cache_raw(cache_key, raw, USER_TTL, time.perf_counter() - start)
+    )
+    return raw
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialize any resources on startup
+    app.state.redis = redis_client
+    if PLAYWRIGHT_WARM_START:
+        try:
+            await _scraper().start_browser()
+        except Exception as e:
+            # Not fatal: the browser is launched again on the first scrape
+            print(f"Error starting browser: {str(e)}")
     yield
-    # Clean up resources on shutdown
+    # Clean up resources on shutdown, letting running scrapes and pending
+    # cache writes finish before the browser and Redis pool close
+    await asyncio.gather(*_inflight.values(), return_exceptions=True)
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    await close_cache()
+    if _scraper_module is not None:
+        await _scraper_module.close_browser()
 
 
 app = FastAPI(
@@ -47,37 +238,26 @@ app = FastAPI(
         "name": "MIT",
     },
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-
-# Enable CORS
+# Rate limit the scraping endpoints
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    RateLimitMiddleware,
+    limit=RATE_LIMIT,
+    window=RATE_LIMIT_WINDOW,
+    paths=["/album/", "/album/similar/", "/search/", "/user/"],
 )
 
-# Add rate limit error handler
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
-
-# Global exception handler
-@app.exception_handler(Exception)
-async def global_exception_handler(request: Request, exc: Exception):
-    metrics.record_error()
-    return JSONResponse(
-        status_code=500,
-        content={
-            "detail": f"Internal server error: {str(exc)}",
-            "path": request.url.path,
-            "method": request.method,
-        },
-    )
+# Enable CORS for all origins
+app.add_middleware(StaticCORSMiddleware)
+
+# Compress larger responses such as albums with tracks and reviews
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+
+# Record response times and server errors for every request
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get(
@@ -91,41 +271,81 @@ async def global_exception_handler(request: Request, exc: Exception):
         503: {"description": "Error accessing album site"},
     },
 )
-@limiter.limit("30/minute")
 async def get_album_endpoint(
-    request: Request,
     artist: str = Query(..., description="Name of the artist", example="Radiohead"),
     album: str = Query(..., description="Name of the album", example="OK Computer"),
     refresh: bool = Query(False, description="Force refresh the cache"),
 ):
-    start_time = time()
     try:
-        cache_key = f"album:{artist}:{album}"
-        
-        # Check cache unless refresh is requested
-        if not refresh and (cached_result := await get_cache(cache_key)):
-            metrics.record_request(cache_hit=True)
-            return Album(**cached_result)
-
-        metrics.record_request(cache_hit=False)
-        result = await get_album_url(artist, album)
-        if not result:
-            raise HTTPException(status_code=404, detail="Album not found")
-
-        url, artist_name, title = result
-        album_data = await scrape_album(url, artist_name, title)
-
-        await set_cache(cache_key, album_data.dict(), ALBUM_TTL)
-        metrics.record_response_time(time() - start_time)
-        return album_data
+        raw = await _get_album_json(artist, album, refresh)
+        return Response(raw, media_type="application/json")
 
     except HTTPException:
         raise
     except Exception as e:
-        metrics.record_error()
         raise HTTPException(status_code=503, detail=str(e))
 
 
+@app.post(
+    "/album/batch",
+    response_model=list[Union[Album, AlbumBatchError]],
+    summary="Get Multiple Albums",
+    description=(
+        "Retrieve detailed information about several albums at once. "
+        "Each album counts as one request towards the album rate limit."
+    ),
+    response_description="Album details, or an error entry, for each query in request order",
+    responses={
+        429: {"description": "Rate limit exceeded"},
+    },
+)
+async def get_album_batch_endpoint(
+    request: Request,
+    queries: list[AlbumQuery] = Body(
+        ..., description="Albums to look up", min_length=1, max_length=BATCH_MAX_SIZE
+    ),
+):
+    # Charge the batch against the single album endpoint's limit, one per album
+    host = request.client.host if request.client else "unknown"
+    allowed = await charge_window(
+        rate_limit_key(host, "/album/"), RATE_LIMIT_WINDOW * 1000, RATE_LIMIT, len(queries)
+    )
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded: {RATE_LIMIT} per {RATE_LIMIT_WINDOW} seconds",
+            headers={"Retry-After": str(RATE_LIMIT_WINDOW)},
+        )
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def get_one(query: AlbumQuery) -> bytes:
+        async with semaphore:
+            return await _get_album_json(query.artist, query.album)
+
+    results = await asyncio.gather(
+        *(get_one(query) for query in queries), return_exceptions=True
+    )
+
+    # Albums are already encoded, so splice them into the JSON array as-is
+    parts = []
+    for query, result in zip(queries, results):
+        if isinstance(result, bytes):
+            parts.append(result)
+            continue
+
+        if isinstance(result, HTTPException):
+            status_code, detail = result.status_code, str(result.detail)
+        else:
+            status_code, detail = 503, str(result)
+        error = AlbumBatchError(
+            artist=query.artist, album=query.album, status_code=status_code, detail=detail
+        )
+        parts.append(_batch_error_adapter.dump_json(error))
+
+    return Response(b"[" + b",".join(parts) + b"]", media_type="application/json")
+
+
 @app.get(
     "/album/similar/",
     response_model=list[Album],
@@ -137,45 +357,25 @@ async def get_album_endpoint(
         503: {"description": "Error accessing album site"},
     },
 )
-@limiter.limit("30/minute")
 async def get_similar_albums_endpoint(
-    request: Request,
     artist: str = Query(..., description="Name of the artist", example="Radiohead"),
     album: str = Query(..., description="Name of the album", example="OK Computer"),
     refresh: bool = Query(False, description="Force refresh the cache"),
     limit: int = Query(5, description="Maximum number of similar albums to return", ge=1, le=10),
 ):
-    start_time = time()
     try:
-        cache_key = f"similar:{artist}:{album}:{limit}"
+        cache_key = f"similar:{_norm(artist)}:{_norm(album)}:{limit}:json:v2"
         
-        # Check cache unless refresh is requested
-        if not refresh and (cached_result := await get_cache(cache_key)):
-            metrics.record_request(cache_hit=True)
-            return [Album(**album_data) for album_data in cached_result]
-
-        metrics.record_request(cache_hit=False)
-        result = await get_album_url(artist, album)
-        if not result:
-            raise HTTPException(status_code=404, detail="Album not found")
-
-        url, _, _ = result
-        similar_albums = await get_similar_albums(url, limit)
-
-        # Cache the list of albums as dictionaries
-        await set_cache(
-            cache_key, 
-            [album.dict() for album in similar_albums], 
-            SIMILAR_TTL
+        raw = await _cached_json(
+            cache_key,
+            lambda: _scrape_similar_json(artist, album, limit, cache_key),
+            refresh,
         )
-        
-        metrics.record_response_time(time() - start_time)
-        return similar_albums
+        return Response(raw, media_type="application/json")
 
     except HTTPException:
         raise
     except Exception as e:
-        metrics.record_error()
         raise HTTPException(status_code=503, detail=str(e))
 
 
@@ -189,29 +389,21 @@ async def get_similar_albums_endpoint(
         503: {"description": "Error accessing album site"},
     },
 )
-@limiter.limit("30/minute")
 async def search_albums_endpoint(
-    request: Request,
     query: str = Query(..., description="Search query", example="Radiohead OK Computer"),
     limit: int = Query(10, description="Maximum number of results to return", ge=1, le=20),
 ):
-    start_time = time()
     try:
-        cache_key = f"search:{query}:{limit}"
-        
-        if cached_result := await get_cache(cache_key):
-            metrics.record_request(cache_hit=True)
-            return [SearchResult(**result) for result in cached_result]
-
-        metrics.record_request(cache_hit=False)
-        results = await search_albums(query, limit)
+        # Hash the query so free-form text keeps keys short and well-formed
+        query_hash = hashlib.blake2b(_norm(query).encode(), digest_size=16).hexdigest()
+        cache_key = f"search:{query_hash}:{limit}:json:v2"
         
-        await set_cache(cache_key, [result.dict() for result in results], SEARCH_TTL)
-        metrics.record_response_time(time() - start_time)
-        return results
+        raw = await _cached_json(
+            cache_key, lambda: _scrape_search_json(query, limit, cache_key)
+        )
+        return Response(raw, media_type="application/json")
 
     except Exception as e:
-        metrics.record_error()
         raise HTTPException(status_code=503, detail=str(e))
 
 
@@ -226,34 +418,23 @@ async def search_albums_endpoint(
         503: {"description": "Error accessing user profile"},
     },
 )
-@limiter.limit("30/minute")
 async def get_user_endpoint(
-    request: Request,
     username: str = Query(
         ..., description="Username on albumoftheyear.org", example="evrynoiseatonce"
     ),
     refresh: bool = Query(False, description="Force refresh the cache"),
 ):
-    start_time = time()
     try:
-        cache_key = f"user:{username}"
+        cache_key = f"user:{username}:json:v2"
         
-        # Check cache unless refresh is requested
-        if not refresh and (cached_result := await get_cache(cache_key)):
-            metrics.record_request(cache_hit=True)
-            return UserProfile(**cached_result)
-
-        metrics.record_request(cache_hit=False)
-        user_profile = await get_user_profile(username)
-
-        await set_cache(cache_key, user_profile.dict(), USER_TTL)
-        metrics.record_response_time(time() - start_time)
-        return user_profile
+        raw = await _cached_json(
+            cache_key, lambda: _scrape_user_json(username, cache_key), refresh
+        )
+        return Response(raw, media_type="application/json")
 
     except HTTPException:
         raise
     except Exception as e:
-        metrics.record_error()
         raise HTTPException(status_code=503, detail=str(e))
 
 
@@ -281,4 +462,8 @@ async def get_user_endpoint(
     },
 )
 async def get_metrics_endpoint():
-    return metrics.get_metrics()
\ No newline at end of file
+    now = time.monotonic()
+    if now - _metrics_cache["at"] >= METRICS_CACHE_SECONDS:
+        _metrics_cache["body"] = orjson.dumps(metrics.get_metrics())
+        _metrics_cache["at"] = now
+    return Response(_metrics_cache["body"], media_type="application/json")
\ No newline at end of file
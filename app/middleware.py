@@ -0,0 +1,163 @@
+import json
+import time
+from typing import Iterable
+
+from .utils.cache import charge_window
+from .utils.metrics import metrics
+
+
+def rate_limit_key(host: str, path: str) -> str:
+    """Key counting a client's requests to a route in the current window"""
+    return f"ratelimit:{host}:{path}"
+
+
+class RateLimitMiddleware:
+    """Fixed-window rate limiting per client address and route"""
+
+    def __init__(self, app, limit: int, window: int, paths: Iterable[str]):
+        self.app = app
+        self.limit = limit
+        self.window_ms = window * 1000
+        self.paths = frozenset(paths)
+
+        # The 429 response never changes, so encode it once
+        self.body = json.dumps(
+            {"detail": f"Rate limit exceeded: {limit} per {window} seconds"}
+        ).encode()
+        self.headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(self.body)).encode()),
+            (b"retry-after", str(window).encode()),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        host = client[0] if client else "unknown"
+        allowed = await charge_window(
+            rate_limit_key(host, scope["path"]), self.window_ms, self.limit
+        )
+
+        if not allowed:
+            await send(
+                {"type": "http.response.start", "status": 429, "headers": self.headers}
+            )
+            await send({"type": "http.response.body", "body": self.body})
+            return
+
+        await self.app(scope, receive, send)
+
+
+class MetricsMiddleware:
+    """Records response times and errors, and turns unhandled exceptions into 500s"""
+
+    # Sent when a request fails before its response has started
+    error_body = json.dumps({"detail": "Internal server error"}).encode()
+    error_headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(error_body)).encode()),
+    ]
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                metrics.record_response_time(time.perf_counter() - start)
+                if message["status"] >= 500:
+                    metrics.record_error()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not response_started:
+                # send_wrapper times the response and counts the 500 as an error
+                await send_wrapper(
+                    {"type": "http.response.start", "status": 500, "headers": self.error_headers}
+                )
+                await send({"type": "http.response.body", "body": self.error_body})
+            else:
+                metrics.record_error()
+
+            # Re-raise so the server logs the traceback, as ServerErrorMiddleware does
+            raise
+
+
+class StaticCORSMiddleware:
+    """
+    Allow-all CORS with credentials, answering preflight requests directly.
+
+    Browsers reject "*" on credentialed requests, so the request's Origin is
+    echoed back with Vary: Origin; everything else is encoded once.
+    """
+
+    headers = [
+        (b"access-control-allow-credentials", b"true"),
+    ]
+    preflight_headers = headers + [
+        (b"access-control-allow-methods", b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"),
+        (b"access-control-max-age", b"600"),
+        (b"vary", b"Origin"),
+        (b"content-length", b"0"),
+    ]
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = request_method = request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        # Not a cross-origin request
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            headers = self.preflight_headers + [(b"access-control-allow-origin", origin)]
+            if request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+            await send({"type": "http.response.start", "status": 204, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = [
+                    (name, value)
+                    for name, value in message.get("headers", [])
+                    if name.lower() != b"vary"
+                ]
+                vary = [value for name, value in message.get("headers", []) if name.lower() == b"vary"]
+                vary.append(b"Origin")
+                message["headers"] = headers + self.headers + [
+                    (b"access-control-allow-origin", origin),
+                    (b"vary", b", ".join(vary)),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
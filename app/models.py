@@ -117,4 +117,18 @@ class SearchResult(BaseModel):
     url: str
     cover_image: Optional[str] = None
     year: Optional[int] = None
-    score: Optional[float] = None
\ No newline at end of file
+    score: Optional[float] = None
+
+
+class AlbumQuery(BaseModel):
+    """An artist and album pair to look up in a batch request"""
+    artist: str
+    album: str
+
+
+class AlbumBatchError(BaseModel):
+    """Batch result entry for an album that could not be retrieved"""
+    artist: str
+    album: str
+    status_code: int
+    detail: str
@@ -4,7 +4,7 @@ from typing import Optional, List, Dict, Tuple, Any
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError, Page
 from fastapi import HTTPException
 
-from ..config import BASE_URL, PLAYWRIGHT_HEADLESS, PLAYWRIGHT_TIMEOUT
+from ..config import BASE_URL, BROWSER_POOL_SIZE, PLAYWRIGHT_HEADLESS, PLAYWRIGHT_TIMEOUT
 from ..models.aoty_models import (
     Album, 
     Track, 
@@ -18,32 +18,72 @@ from ..models.aoty_models import (
     UserStats
 )
 
-# Cache for the Playwright browser instance
+# Shared Playwright browser and a pool of reusable browser contexts
+_playwright = None
 _browser = None
-_browser_context = None
+_context_pool: Optional[asyncio.Queue] = None
+_start_lock = asyncio.Lock()
 
 
-async def get_browser():
-    """Get or create a shared Playwright browser instance"""
-    global _browser, _browser_context
-    
-    if _browser is None:
-        playwright = await async_playwright().start()
-        _browser = await playwright.chromium.launch(headless=PLAYWRIGHT_HEADLESS)
-        
-    if _browser_context is None:
-        _browser_context = await _browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
-            viewport={"width": 1280, "height": 800}
-        )
-    
-    return _browser_context
+async def start_browser(pool_size: int = BROWSER_POOL_SIZE) -> None:
+    """Launch the shared browser and pre-create its pool of contexts"""
+    global _playwright, _browser, _context_pool
+
+    async with _start_lock:
+        if _context_pool is not None:
+            return
+
+        _playwright = await async_playwright().start()
+        try:
+            _browser = await _playwright.chromium.launch(headless=PLAYWRIGHT_HEADLESS)
+
+            pool = asyncio.Queue()
+            for _ in range(pool_size):
+                pool.put_nowait(await _browser.new_context(
+                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
+                    viewport={"width": 1280, "height": 800}
+                ))
+            _context_pool = pool
+        except Exception:
+            # Leave nothing half-started so the next call can try again
+            if _browser:
+                await _browser.close()
+                _browser = None
+            await _playwright.stop()
+            _playwright = None
+            raise
+
+
+async def acquire_context():
+    """Take a browser context from the pool, waiting if all are in use"""
+    if _context_pool is None:
+        await start_browser()
+    return await _context_pool.get()
+
+
+def release_context(context) -> None:
+    """Return a browser context to the pool, unless the browser has been closed"""
+    if _context_pool is not None:
+        _context_pool.put_nowait(context)
 
 
 async def new_page():
-    """Create a new page from the browser context"""
-    context = await get_browser()
-    return await context.new_page()
+    """Create a new page in a pooled browser context; close it with close_page()"""
+    context = await acquire_context()
+    try:
+        return await context.new_page()
+    except Exception:
+        release_context(context)
+        raise
+
+
+async def close_page(page: Page) -> None:
+    """Close a page from new_page() and return its context to the pool"""
+    context = page.context
+    try:
+        await page.close()
+    finally:
+        release_context(context)
 
 
 def parse_number(text: str | int) -> int:
@@ -101,7 +141,7 @@ async def get_album_url(artist: str, album: str) -> Optional[Tuple[str, str, str
             return None
             
         finally:
-            await page.close()
+            await close_page(page)
     except PlaywrightTimeoutError:
         raise HTTPException(status_code=503, detail="Timeout searching for album")
     except Exception as e:
@@ -453,7 +493,7 @@ async def scrape_album(url: str, artist: str, title: str) -> Album:
             )
             
         finally:
-            await page.close()
+            await close_page(page)
     except PlaywrightTimeoutError:
         raise HTTPException(status_code=503, detail="Timeout scraping album")
     except HTTPException:
@@ -525,7 +565,7 @@ async def get_similar_albums(url: str, limit: int = 5) -> List[Album]:
             return similar_albums
             
         finally:
-            await page.close()
+            await close_page(page)
     except PlaywrightTimeoutError:
         raise HTTPException(status_code=503, detail="Timeout getting similar albums")
     except Exception as e:
@@ -609,7 +649,7 @@ async def search_albums(query: str, limit: int = 10) -> List[SearchResult]:
             return results
             
         finally:
-            await page.close()
+            await close_page(page)
     except PlaywrightTimeoutError:
         raise HTTPException(status_code=503, detail="Timeout searching albums")
     except Exception as e:
@@ -873,7 +913,7 @@ async def get_user_profile(username: str) -> UserProfile:
             )
             
         finally:
-            await page.close()
+            await close_page(page)
             
     except PlaywrightTimeoutError:
         raise HTTPException(status_code=503, detail="Timeout accessing user profile")
@@ -886,14 +926,19 @@ async def get_user_profile(username: str) -> UserProfile:
 
 
 async def close_browser():
-    """Close the shared browser instance"""
-    global _browser, _browser_context
+    """Close the pooled contexts and the shared browser instance"""
+    global _playwright, _browser, _context_pool
     
-    if _browser_context:
-        await _browser_context.close()
-        _browser_context = None
+    if _context_pool:
+        while not _context_pool.empty():
+            await _context_pool.get_nowait().close()
+        _context_pool = None
         
     if _browser:
         await _browser.close()
         _browser = None
 
+    if _playwright:
+        await _playwright.stop()
+        _playwright = None
+
@@ -1,39 +1,86 @@
+import asyncio
 import json
-import httpx
+import math
+import msgpack
+import random
 import time
-from typing import Any, Optional, Dict
-from ..config import REDIS_URL, REDIS_TOKEN
+from typing import Any, Awaitable, Callable, NamedTuple, Optional, Dict
+from cachetools import TLRUCache, TTLCache
+from redis.asyncio import BlockingConnectionPool, Redis
+from ..config import REDIS_URL, REDIS_MAX_CONNECTIONS
 
-# Headers for Redis REST API
-HEADERS = {"Authorization": f"Bearer {REDIS_TOKEN}"} if REDIS_TOKEN else {}
+# Shared Redis client over a connection pool, or None when Redis is not configured
+redis_client: Optional[Redis] = (
+    Redis.from_pool(
+        BlockingConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=5.0,
+            socket_timeout=5.0,
+            socket_connect_timeout=5.0,
+        )
+    )
+    if REDIS_URL
+    else None
+)
 
 # Cache TTLs (in seconds)
 ALBUM_TTL = 604800     # 1 week
 SIMILAR_TTL = 86400    # 1 day
 USER_TTL = 3600        # 1 hour
 SEARCH_TTL = 43200     # 12 hours
+NEGATIVE_TTL = 60      # 1 minute, for lookups that found nothing
+
+# Stored in place of a raw payload when a lookup found nothing; never valid JSON
+NOT_FOUND_MARKER = b"__miss__"
+
+# XFetch early expiration: larger values refresh further ahead of expiry
+XFETCH_BETA = 1.0
 
 # In-memory cache fallback
 memory_cache: Dict[str, Dict[str, Any]] = {}
 
+# Process-local cache in front of Redis so hot keys skip the round-trip.
+# Entries may be up to LOCAL_CACHE_TTL seconds staler than Redis.
+LOCAL_CACHE_SIZE = 1024
+LOCAL_CACHE_TTL = 60
+local_cache: TTLCache = TTLCache(maxsize=LOCAL_CACHE_SIZE, ttl=LOCAL_CACHE_TTL)
+
+# Rate-limit counters used when Redis is unavailable. Kept apart from memory_cache
+# and bounded, so each entry expires with its window and clients can't grow it.
+RATE_LIMIT_CACHE_SIZE = 10000
+rate_limit_counters: TLRUCache = TLRUCache(
+    maxsize=RATE_LIMIT_CACHE_SIZE,
+    ttu=lambda key, value, now: value["expires_at"],
+)
+
+# Lookups in flight per key, so concurrent local misses share a single fetch
+_pending_fetches: Dict[str, asyncio.Task] = {}
+
+# Fixed-window counter: charge amount only if it stays within the limit, and start
+# the window's expiry on a counter that has none, all in one round trip
+CHARGE_WINDOW_SCRIPT = (
+    "local n=tonumber(redis.call('GET',KEYS[1]) or '0')+tonumber(ARGV[2]); "
+    "if n>tonumber(ARGV[3]) then return 0 end; "
+    "redis.call('INCRBY',KEYS[1],ARGV[2]); "
+    "if redis.call('PTTL',KEYS[1])<0 then redis.call('PEXPIRE',KEYS[1],ARGV[1]) end; "
+    "return 1"
+)
+_charge_window_script = redis_client.register_script(CHARGE_WINDOW_SCRIPT) if redis_client else None
+
 
 async def set_cache(key: str, value: Any, expire_seconds: int = 3600) -> None:
     """
     Set a value in Redis cache with expiration.
     Falls back to in-memory cache if Redis is not available.
     """
-    # First, try to use Redis REST API
-    if REDIS_URL and REDIS_TOKEN:
-        try:
-            value_str = json.dumps(value)
-            pipeline_data = [["SET", key, value_str], ["EXPIRE", key, str(expire_seconds)]]
+    local_cache[key] = value
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{REDIS_URL}/pipeline", headers=HEADERS, json=pipeline_data, timeout=5.0
-                )
-                response.raise_for_status()
-                return
+    # First, try to use Redis
+    if redis_client:
+        try:
+            await redis_client.set(key, json.dumps(value), ex=expire_seconds)
+            return
 
         except Exception as e:
             print(f"Error setting Redis cache: {str(e)}")
@@ -46,23 +93,131 @@ async def set_cache(key: str, value: Any, expire_seconds: int = 3600) -> None:
     }
 
 
+async def _get_through_local(
+    key: str, fetch: Callable[[str], Awaitable[Optional[Any]]]
+) -> Optional[Any]:
+    """
+    Serve a key from the process-local cache, fetching it at most once
+    concurrently on a local miss.
+    """
+    if (value := local_cache.get(key)) is not None:
+        return value
+
+    task = _pending_fetches.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_into_local(key, fetch))
+        _pending_fetches[key] = task
+        task.add_done_callback(lambda _: _pending_fetches.pop(key, None))
+
+    # Every concurrent caller gets the same result, including None on a miss
+    return await asyncio.shield(task)
+
+
+async def _fetch_into_local(
+    key: str, fetch: Callable[[str], Awaitable[Optional[Any]]]
+) -> Optional[Any]:
+    """Fetch a key and keep a found value in the process-local cache"""
+    value = await fetch(key)
+    if value is not None:
+        local_cache[key] = value
+    return value
+
+
 async def get_cache(key: str) -> Optional[Any]:
     """
-    Get a value from Redis cache.
+    Get a value from the local cache, then Redis cache.
+    Falls back to in-memory cache if Redis is not available.
+    """
+    return await _get_through_local(key, _fetch_cache)
+
+
+async def _fetch_cache(key: str) -> Optional[Any]:
+    """Get a value from Redis cache, or the in-memory fallback"""
+    # First, try to use Redis
+    if redis_client:
+        try:
+            value = await redis_client.get(key)
+            if value is not None:
+                return json.loads(value)
+
+        except Exception as e:
+            print(f"Error getting Redis cache: {str(e)}")
+            # Fall through to memory cache
+
+    # Check in-memory cache as fallback
+    if key in memory_cache:
+        cache_item = memory_cache[key]
+        if cache_item["expires_at"] > time.time():
+            return cache_item["value"]
+        else:
+            # Remove expired item
+            del memory_cache[key]
+
+    return None
+
+
+class CachedRaw(NamedTuple):
+    """Raw cached bytes, and whether this read should recompute them early"""
+    value: bytes
+    expired_early: bool
+
+
+async def set_cache_raw(
+    key: str, value: bytes, expire_seconds: int = 3600, compute_time: float = 0.0
+) -> None:
+    """
+    Set already-encoded bytes in Redis cache with expiration, skipping encoding.
+    compute_time is how long the value took to produce, used for early expiration.
     Falls back to in-memory cache if Redis is not available.
     """
-    # First, try to use Redis REST API
-    if REDIS_URL and REDIS_TOKEN:
+    entry = (value, time.time(), expire_seconds, compute_time)
+    local_cache[key] = entry
+
+    # First, try to use Redis
+    if redis_client:
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{REDIS_URL}/get/{key}", headers=HEADERS, timeout=5.0
-                )
-                response.raise_for_status()
+            await redis_client.set(key, msgpack.packb(entry), ex=expire_seconds)
+            return
+
+        except Exception as e:
+            print(f"Error setting Redis cache: {str(e)}")
+            # Fall through to memory cache
+
+    # Use in-memory cache as fallback
+    memory_cache[key] = {
+        "value": entry,
+        "expires_at": time.time() + expire_seconds
+    }
+
+
+async def get_cache_raw(key: str) -> Optional[CachedRaw]:
+    """
+    Get the stored bytes for a key from the local cache, then Redis cache,
+    skipping decoding.
+    Uses XFetch to flag a small, growing share of reads near expiry as
+    expired early, so a single caller refreshes a hot key before it lapses.
+    Falls back to in-memory cache if Redis is not available.
+    """
+    entry = await _get_through_local(key, _fetch_cache_raw)
+    if entry is None:
+        return None
+
+    value, computed_at, ttl, compute_time = entry
+    # -log(u) is exponentially distributed, so costlier values refresh earlier
+    delta = -compute_time * XFETCH_BETA * math.log(1.0 - random.random())
+    return CachedRaw(value, time.time() + delta >= computed_at + ttl)
 
-                data = response.json()
-                if data.get("result"):
-                    return json.loads(data["result"])
+
+async def _fetch_cache_raw(key: str) -> Optional[tuple]:
+    """Get the stored entry for a key from Redis cache, or the in-memory fallback"""
+    # First, try to use Redis
+    if redis_client:
+        try:
+            value = await redis_client.get(key)
+            if value is not None:
+                # Unpack here so a malformed entry is logged and treated as a miss
+                value, computed_at, ttl, compute_time = msgpack.unpackb(value, use_list=False)
+                return (value, computed_at, ttl, compute_time)
 
         except Exception as e:
             print(f"Error getting Redis cache: {str(e)}")
@@ -80,15 +235,45 @@ async def get_cache(key: str) -> Optional[Any]:
     return None
 
 
+async def charge_window(key: str, window_ms: int, limit: int, amount: int = 1) -> bool:
+    """
+    Add amount to a counter expiring window_ms after its first hit, unless that
+    would take it over limit. Returns whether the charge was made.
+    Falls back to in-memory counters if Redis is not available.
+    """
+    # First, try to use Redis
+    if redis_client:
+        try:
+            return bool(await _charge_window_script(keys=[key], args=[window_ms, amount, limit]))
+
+        except Exception as e:
+            print(f"Error charging Redis counter: {str(e)}")
+            # Fall through to memory cache
+
+    # Use in-memory counters as fallback; expired windows are dropped by the cache
+    cache_item = rate_limit_counters.get(key)
+    count = cache_item["value"] if cache_item else 0
+    if count + amount > limit:
+        return False
+    if cache_item is None:
+        cache_item = rate_limit_counters[key] = {
+            "value": 0,
+            "expires_at": time.monotonic() + window_ms / 1000
+        }
+    cache_item["value"] += amount
+    return True
+
+
 async def delete_cache(key: str) -> None:
     """
     Delete a value from Redis cache and in-memory cache.
     """
+    local_cache.pop(key, None)
+
     # Try to delete from Redis
-    if REDIS_URL and REDIS_TOKEN:
+    if redis_client:
         try:
-            async with httpx.AsyncClient() as client:
-                await client.get(f"{REDIS_URL}/del/{key}", headers=HEADERS, timeout=5.0)
+            await redis_client.delete(key)
         except Exception as e:
             print(f"Error deleting Redis cache: {str(e)}")
 
@@ -102,31 +287,32 @@ async def clear_cache_pattern(pattern: str) -> None:
     Clear all cache keys matching a pattern.
     Example: clear_cache_pattern("album:*") clears all album caches
     """
-    if REDIS_URL and REDIS_TOKEN:
+    if redis_client:
         try:
-            async with httpx.AsyncClient() as client:
-                # Get keys matching pattern
-                response = await client.get(
-                    f"{REDIS_URL}/keys/{pattern}", headers=HEADERS, timeout=5.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("result") and isinstance(data["result"], list):
-                    # Delete each key
-                    for key in data["result"]:
-                        await delete_cache(key)
-                        
+            # Collect keys matching pattern without blocking Redis like KEYS does
+            keys = [key async for key in redis_client.scan_iter(match=pattern)]
+            if keys:
+                await redis_client.delete(*keys)
+
         except Exception as e:
             print(f"Error clearing cache pattern: {str(e)}")
     
-    # Clear matching keys from memory cache
+    # Clear matching keys from memory and local caches
     if "*" in pattern:
         prefix = pattern.split("*")[0]
         keys_to_delete = [k for k in memory_cache.keys() if k.startswith(prefix)]
         for key in keys_to_delete:
             del memory_cache[key]
+        for key in [k for k in local_cache.keys() if k.startswith(prefix)]:
+            local_cache.pop(key, None)
     else:
         # Exact match
         if pattern in memory_cache:
-            del memory_cache[pattern]
\ No newline at end of file
+            del memory_cache[pattern]
+        local_cache.pop(pattern, None)
+
+
+async def close_cache() -> None:
+    """Close the Redis connection pool"""
+    if redis_client:
+        await redis_client.aclose()
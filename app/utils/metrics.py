@@ -1,5 +1,5 @@
-import threading
 import time
+from array import array
 from dataclasses import dataclass, asdict
 from datetime import datetime
 from typing import Dict
@@ -37,53 +37,75 @@ class Metrics:
 
 
 class MetricsCollector:
-    """Collects and manages API metrics"""
+    """
+    Collects and manages API metrics.
+
+    Metrics are only recorded from the event loop thread, so plain counters
+    need no lock. Response times go into a fixed ring buffer and are only
+    averaged when metrics are read.
+    """
+
+    # Response times kept for the average; a power of two so indexing is a mask
+    RESPONSE_TIME_SAMPLES = 1024
     
     def __init__(self):
-        self._metrics = Metrics()
-        self._lock = threading.Lock()
+        self.reset()
         
     def record_request(self, cache_hit: bool = False, endpoint: str = None) -> None:
         """Record a new request"""
-        with self._lock:
-            self._metrics.total_requests += 1
-            if cache_hit:
-                self._metrics.cache_hits += 1
-            else:
-                self._metrics.cache_misses += 1
+        self._total_requests += 1
+        if cache_hit:
+            self._cache_hits += 1
+        else:
+            self._cache_misses += 1
                 
-            # Record endpoint hit if provided
-            if endpoint and endpoint in self._metrics.endpoint_hits:
-                self._metrics.endpoint_hits[endpoint] += 1
+        # Record endpoint hit if provided
+        if endpoint and endpoint in self._endpoint_hits:
+            self._endpoint_hits[endpoint] += 1
 
     def record_error(self) -> None:
         """Record an error"""
-        with self._lock:
-            self._metrics.errors += 1
+        self._errors += 1
 
     def record_response_time(self, duration: float) -> None:
         """Record response time for a request"""
-        with self._lock:
-            # Update rolling average
-            current_avg = self._metrics.avg_response_time
-            total = current_avg * (self._metrics.total_requests - 1)
-            self._metrics.avg_response_time = (
-                total + duration
-            ) / self._metrics.total_requests
+        self._response_times[self._timed_requests & (self.RESPONSE_TIME_SAMPLES - 1)] = duration
+        self._timed_requests += 1
             
-            # Update max response time if needed
-            if duration > self._metrics.max_response_time:
-                self._metrics.max_response_time = duration
+        # Update max response time if needed
+        if duration > self._max_response_time:
+            self._max_response_time = duration
 
     def get_metrics(self) -> Dict:
         """Get current metrics as a dictionary"""
-        with self._lock:
-            return self._metrics.to_dict()
+        # Average over the most recent samples held in the ring buffer
+        samples = min(self._timed_requests, self.RESPONSE_TIME_SAMPLES)
+        avg_response_time = (
+            sum(self._response_times[:samples]) / samples if samples else 0.0
+        )
+
+        return Metrics(
+            total_requests=self._total_requests,
+            cache_hits=self._cache_hits,
+            cache_misses=self._cache_misses,
+            errors=self._errors,
+            avg_response_time=avg_response_time,
+            max_response_time=self._max_response_time,
+            last_reset=self._last_reset,
+            endpoint_hits=dict(self._endpoint_hits),
+        ).to_dict()
 
     def reset(self) -> None:
         """Reset all metrics"""
-        with self._lock:
-            self._metrics = Metrics()
+        self._total_requests = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._errors = 0
+        self._timed_requests = 0
+        self._response_times = array("d", bytes(8 * self.RESPONSE_TIME_SAMPLES))
+        self._max_response_time = 0.0
+        self._last_reset = datetime.now()
+        self._endpoint_hits = Metrics().endpoint_hits
 
 
 # Singleton instance